@@ -3,6 +3,7 @@ import db_manager as db
 import pandas as pd
 from datetime import date
 import plotly.express as px
+import plotly.io as pio
 
 st.set_page_config(
     page_title="Personal Finance",
@@ -72,24 +73,96 @@ st.divider()
 # Charts
 col_left, col_right = st.columns(2)
 
+selected_month_str = f"{selected_year}-{selected_month:02d}"
+
+# Figures are built once per (month, chart) and served as cached JSON until a
+# write touches the data behind them.
+def build_expense_breakdown():
+    expense_df = db.get_expense_breakdown(selected_year, selected_month)
+    if expense_df.empty:
+        return None
+    fig_pie = px.pie(expense_df, values='total', names='type', hole=0.4, color_discrete_sequence=px.colors.sequential.Bluyl)
+    return fig_pie.to_json()
+
+def build_savings_trend():
+    trend_df = db.get_monthly_savings_trend()
+    if trend_df.empty:
+        return None
+    fig_line = px.line(trend_df, x='month', y='savings', markers=True)
+    fig_line.update_traces(line_color='#00FF00')
+    return fig_line.to_json()
+
 with col_left:
     st.subheader(f"Expense Breakdown ({selected_month}/{selected_year})")
-    expense_df = db.get_expense_breakdown(selected_year, selected_month)
-    if not expense_df.empty:
-        fig_pie = px.pie(expense_df, values='total', names='type', hole=0.4, color_discrete_sequence=px.colors.sequential.Bluyl)
-        st.plotly_chart(fig_pie, use_container_width=True)
+    pie_json = db.get_chart_payload('expense_breakdown', selected_month_str, build_expense_breakdown)
+    if pie_json:
+        st.plotly_chart(pio.from_json(pie_json), use_container_width=True)
     else:
         st.info("No expenses found for this period.")
 
 with col_right:
     st.subheader("Net Savings Trend")
-    trend_df = db.get_monthly_savings_trend()
-    if not trend_df.empty:
-        fig_line = px.line(trend_df, x='month', y='savings', markers=True)
-        fig_line.update_traces(line_color='#00FF00')
-        st.plotly_chart(fig_line, use_container_width=True)
+    line_json = db.get_chart_payload('savings_trend', None, build_savings_trend)
+    if line_json:
+        st.plotly_chart(pio.from_json(line_json), use_container_width=True)
     else:
         st.info("No data available for trends.")
 
+st.divider()
+
+# Analytics (computed in SQL window functions)
+def build_budget_burndown():
+    burndown_df = db.get_budget_burndown(selected_year, selected_month)
+    if burndown_df.empty or (burndown_df['cumulative_spent'].iloc[-1] == 0 and burndown_df['ideal_remaining'].iloc[0] == 0):
+        return None
+    fig_burn = px.line(burndown_df, x='day', y=['remaining', 'ideal_remaining'])
+    fig_burn.update_traces(selector={'name': 'remaining'}, line_color='#00FF00')
+    fig_burn.update_traces(selector={'name': 'ideal_remaining'}, line_dash='dash', line_color='#888')
+    fig_burn.update_layout(yaxis_title="Remaining Budget (INR)", xaxis_title=None, legend_title=None)
+    return fig_burn.to_json()
+
+def build_category_yoy():
+    yoy_df = db.get_category_yoy(selected_year, selected_month)
+    if yoy_df.empty:
+        return None
+    fig_yoy = px.bar(yoy_df, x='type', y=['prev_year_total', 'total'], barmode='group',
+                     color_discrete_sequence=['#555', '#00FF00'])
+    fig_yoy.update_layout(yaxis_title="Amount (INR)", xaxis_title=None, legend_title=None)
+    return fig_yoy.to_json()
+
+def build_category_rolling():
+    rolling_df = db.get_category_rolling_averages(months=12)
+    if rolling_df.empty:
+        return None
+    long_df = rolling_df.melt(id_vars=['month', 'type'], value_vars=['avg_3m', 'avg_12m'], var_name='window', value_name='average')
+    fig_rolling = px.line(long_df, x='month', y='average', color='type', line_dash='window')
+    fig_rolling.update_layout(yaxis_title="Average Monthly Spend (INR)", xaxis_title=None)
+    return fig_rolling.to_json()
+
+col_burn, col_yoy = st.columns(2)
+
+with col_burn:
+    st.subheader("Budget Burn-down")
+    burn_json = db.get_chart_payload('budget_burndown', selected_month_str, build_budget_burndown)
+    if burn_json:
+        st.plotly_chart(pio.from_json(burn_json), use_container_width=True)
+    else:
+        st.info("No budget or expenses for this period.")
+
+with col_yoy:
+    st.subheader("Year-over-Year by Category")
+    yoy_json = db.get_chart_payload('category_yoy', selected_month_str, build_category_yoy)
+    if yoy_json:
+        st.plotly_chart(pio.from_json(yoy_json), use_container_width=True)
+    else:
+        st.info("No expenses to compare for this period.")
+
+st.subheader("Category Spend: Rolling 3 / 12-Month Averages")
+rolling_json = db.get_chart_payload('category_rolling', None, build_category_rolling)
+if rolling_json:
+    st.plotly_chart(pio.from_json(rolling_json), use_container_width=True)
+else:
+    st.info("No data available for trends.")
+
 st.sidebar.markdown("---")
 st.sidebar.info("Use the side menu to navigate to Transactions, Budgets, or Import/Export.")
@@ -1,293 +1,1304 @@
 import psycopg2
+from psycopg2 import pool as pg_pool
 import pandas as pd
+from pandas.io.sql import DatabaseError as PandasDatabaseError
 from datetime import date, datetime
 import streamlit as st
+import functools
+import gzip
+import io
+import json
 import os
+import re
+import select
+import threading
+import time
+import uuid
+from contextlib import contextmanager
 
-# Supabase Connection
-def get_connection():
-    # Look for secrets in .streamlit/secrets.toml
-    # Expected format:
+# How long (seconds) a session keeps reading from the primary after its own write,
+# so it never sees a replica that has not caught up yet.
+READ_YOUR_WRITES_SECONDS = 5
+
+# Connections opened up front / at most per target (primary / replica) by the
+# process-wide pool, and how long a query waits for a free one; override in
+# [supabase] with pool_min_conn, pool_max_conn and pool_wait_seconds (or
+# SUPABASE_* env vars). Up to pool_max_conn connections stay open once used.
+POOL_MIN_CONN = 1
+POOL_MAX_CONN = 10
+POOL_WAIT_SECONDS = 10
+
+# Upper bounds so a slow or unreachable database can't hang a page; all three
+# can be overridden in [supabase] (connect_timeout, statement_timeout_ms,
+# idle_in_transaction_timeout_ms) or SUPABASE_* env vars.
+CONNECT_TIMEOUT_SECONDS = 5
+STATEMENT_TIMEOUT_MS = 15000
+IDLE_IN_TRANSACTION_TIMEOUT_MS = 60000
+
+# After this many consecutive failures a target fails fast for the cooldown
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_COOLDOWN_SECONDS = 30
+
+# Pooled connections idle longer than this are pinged before reuse
+POOL_CHECK_IDLE_SECONDS = 30
+
+class DatabaseUnavailable(Exception):
+    """The database could not be reached or did not answer in time."""
+
+class DatabaseBusy(DatabaseUnavailable):
+    """No pooled connection freed up in time; the database itself may be fine."""
+
+# Used when session state is unavailable (e.g. scripts importing db_manager directly)
+_local_state = {}
+
+def _session_state():
+    try:
+        return st.session_state
+    except Exception:
+        return _local_state
+
+def _secrets_section(name):
+    try:
+        if name in st.secrets:
+            return st.secrets[name]
+    except Exception:
+        pass
+    return None
+
+def _connection_params(target='primary'):
+    # Primary:
     # [supabase]
     # host = "..."
     # database = "postgres"
     # user = "postgres"
     # password = "..."
     # port = 5432
-    
-    try:
-        if 'supabase' in st.secrets:
-            secrets = st.secrets['supabase']
-            return psycopg2.connect(
-                host=secrets['host'],
-                database=secrets['database'],
-                user=secrets['user'],
-                password=secrets['password'],
-                port=secrets['port']
-            )
+    #
+    # Optional read replica, any key not given falls back to the primary's value:
+    # [supabase_replica]
+    # host = "..."
+    # port = 5432
+    # read_your_writes_seconds = 5
+    secrets = _secrets_section('supabase')
+    if secrets is not None:
+        params = {
+            'host': secrets['host'],
+            'database': secrets['database'],
+            'user': secrets['user'],
+            'password': secrets['password'],
+            'port': secrets['port'],
+        }
+    else:
+        # Fallback for local testing if env vars are set (optional)
+        params = {
+            'host': os.getenv("SUPABASE_HOST"),
+            'database': os.getenv("SUPABASE_DB"),
+            'user': os.getenv("SUPABASE_USER"),
+            'password': os.getenv("SUPABASE_PASS"),
+            'port': os.getenv("SUPABASE_PORT", 5432),
+        }
+
+    if target == 'replica':
+        replica = _secrets_section('supabase_replica')
+        if replica is not None:
+            for key in params:
+                if key in replica:
+                    params[key] = replica[key]
         else:
-            # Fallback for local testing if env vars are set (optional)
-            return psycopg2.connect(
-                host=os.getenv("SUPABASE_HOST"),
-                database=os.getenv("SUPABASE_DB"),
-                user=os.getenv("SUPABASE_USER"),
-                password=os.getenv("SUPABASE_PASS"),
-                port=os.getenv("SUPABASE_PORT", 5432)
-            )
+            params['host'] = os.getenv("SUPABASE_REPLICA_HOST")
+            params['database'] = os.getenv("SUPABASE_REPLICA_DB", params['database'])
+            params['user'] = os.getenv("SUPABASE_REPLICA_USER", params['user'])
+            params['password'] = os.getenv("SUPABASE_REPLICA_PASS", params['password'])
+            params['port'] = os.getenv("SUPABASE_REPLICA_PORT", params['port'])
+
+    params['connect_timeout'] = int(_setting('connect_timeout', CONNECT_TIMEOUT_SECONDS))
+    params['options'] = (
+        f"-c statement_timeout={int(_setting('statement_timeout_ms', STATEMENT_TIMEOUT_MS))} "
+        f"-c idle_in_transaction_session_timeout={int(_setting('idle_in_transaction_timeout_ms', IDLE_IN_TRANSACTION_TIMEOUT_MS))}"
+    )
+    return params
+
+def _setting(key, default):
+    secrets = _secrets_section('supabase')
+    if secrets is not None and key in secrets:
+        return secrets[key]
+    return os.getenv(f"SUPABASE_{key.upper()}", default)
+
+def _replica_configured():
+    return _secrets_section('supabase_replica') is not None or bool(os.getenv("SUPABASE_REPLICA_HOST"))
+
+def _read_your_writes_seconds():
+    replica = _secrets_section('supabase_replica')
+    if replica is not None and 'read_your_writes_seconds' in replica:
+        return float(replica['read_your_writes_seconds'])
+    return float(os.getenv("SUPABASE_READ_YOUR_WRITES_SECONDS", READ_YOUR_WRITES_SECONDS))
+
+def _mark_write():
+    # Called after every commit; pins this session's reads to the primary for a while
+    _session_state()['_db_last_write'] = time.time()
+
+def _wrote_recently():
+    last_write = _session_state().get('_db_last_write')
+    return last_write is not None and time.time() - last_write < _read_your_writes_seconds()
+
+def _pool_max_conn():
+    return int(_setting('pool_max_conn', POOL_MAX_CONN))
+
+class _KeepIdlePool(pg_pool.ThreadedConnectionPool):
+    # psycopg2 closes every returned connection beyond minconn, so under load most
+    # checkouts would open (and PREPARE on) a new backend. Keep up to maxconn idle.
+    def _putconn(self, conn, key=None, close=False):
+        # Called with the pool's lock held, and minconn is only read here and in __init__
+        minconn = self.minconn
+        self.minconn = self.maxconn
+        try:
+            super()._putconn(conn, key, close)
+        finally:
+            self.minconn = minconn
+
+@st.cache_resource
+def _get_pool(target):
+    # One pool per Streamlit server process, shared by all sessions
+    return _KeepIdlePool(int(_setting('pool_min_conn', POOL_MIN_CONN)), _pool_max_conn(),
+                         **_connection_params(target))
+
+@st.cache_resource
+def _pool_slots(target):
+    # getconn() raises at once when the pool is exhausted; callers queue here instead
+    return threading.BoundedSemaphore(_pool_max_conn())
+
+# --- Circuit Breaker ---
+@st.cache_resource
+def _breakers():
+    # target -> consecutive failures / time until which the target fails fast
+    return {'lock': threading.Lock(), 'failures': {}, 'open_until': {}}
+
+def _breaker_check(target):
+    breakers = _breakers()
+    with breakers['lock']:
+        open_until = breakers['open_until'].get(target, 0)
+    if time.time() < open_until:
+        raise DatabaseUnavailable(f"{target} database marked unavailable for another {open_until - time.time():.0f}s")
+
+def _breaker_success(target):
+    breakers = _breakers()
+    with breakers['lock']:
+        breakers['failures'][target] = 0
+        breakers['open_until'].pop(target, None)
+
+def _breaker_failure(target):
+    breakers = _breakers()
+    with breakers['lock']:
+        failures = breakers['failures'].get(target, 0) + 1
+        breakers['failures'][target] = failures
+        if failures >= BREAKER_FAILURE_THRESHOLD:
+            breakers['open_until'][target] = time.time() + BREAKER_COOLDOWN_SECONDS
+
+def _is_outage(error):
+    # Connection loss and timeouts (QueryCanceled is an OperationalError); pandas
+    # wraps driver errors in its own DatabaseError. Waiting on our own pool
+    # (DatabaseBusy / PoolError) is local back-pressure, not an outage.
+    if isinstance(error, PandasDatabaseError) and error.__cause__ is not None:
+        error = error.__cause__
+    if isinstance(error, (DatabaseBusy, pg_pool.PoolError)):
+        return False
+    return isinstance(error, (DatabaseUnavailable, psycopg2.OperationalError, psycopg2.InterfaceError))
+
+# id(connection) -> (pool, target) it was checked out from
+_checked_out = {}
+
+# id(connection) -> when it was last returned to its pool
+_idle_since = {}
+
+def _connection_alive(con):
+    # A connection the server dropped while idle still reports closed == 0
+    # until it is used, so ping the ones that sat idle for a while
+    if con.closed:
+        return False
+    idle_since = _idle_since.pop(id(con), None)
+    if idle_since is None or time.time() - idle_since < POOL_CHECK_IDLE_SECONDS:
+        return True
+    try:
+        cur = con.cursor()
+        cur.execute("SELECT 1")
+        cur.close()
+        con.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def _checkout(target):
+    _breaker_check(target)
+    slots = _pool_slots(target)
+    if not slots.acquire(timeout=float(_setting('pool_wait_seconds', POOL_WAIT_SECONDS))):
+        raise DatabaseBusy(f"timed out waiting for a free {target} connection")
+    try:
+        pool = _get_pool(target)
+        con = pool.getconn()
+        while not _connection_alive(con):
+            # Discard it; the pool opens a fresh connection once its idle ones are used up
+            pool.putconn(con, close=True)
+            _forget_connection(con)
+            con = pool.getconn()
+    except pg_pool.PoolError as e:
+        slots.release()
+        raise DatabaseBusy(str(e)) from e
     except Exception as e:
-        st.error(f"Database connection failed: {e}")
-        return None
+        slots.release()
+        _breaker_failure(target)
+        raise DatabaseUnavailable(f"Database connection failed: {e}") from e
+    _checked_out[id(con)] = (pool, target)
+    return con
 
-def init_db():
-    con = get_connection()
-    if not con:
+def release_connection(con):
+    # Return a connection to its pool; any open transaction is rolled back
+    pool, target = _checked_out.pop(id(con), (None, None))
+    if pool is None:
+        con.close()
+    else:
+        _idle_since[id(con)] = time.time()
+        pool.putconn(con)
+        _pool_slots(target).release()
+    if con.closed:
+        # Broken connections are closed rather than pooled
+        _forget_connection(con)
+
+def _forget_connection(con):
+    # Drop bookkeeping kept per connection once it is closed for good
+    _idle_since.pop(id(con), None)
+    _prepared_on.pop(id(con), None)
+
+# Supabase Connection
+def get_connection(target='primary'):
+    # Raises DatabaseUnavailable instead of hanging or returning None
+    return _checkout(target)
+
+# Per-thread routing override, set while (re)building shared cache entries
+_routing = threading.local()
+
+def get_read_connection():
+    # Read-only queries go to the replica when one is configured, unless this
+    # session wrote recently (read-your-writes) or the replica is unreachable.
+    force_primary = getattr(_routing, 'force_primary', False)
+    if _replica_configured() and not _wrote_recently() and not force_primary:
+        try:
+            return _checkout('replica')
+        except DatabaseUnavailable:
+            pass
+    return get_connection()
+
+@contextmanager
+def _connection(read_only=False):
+    # Checks a connection out for one unit of work and always hands it back.
+    # Outage errors trip the breaker and surface as DatabaseUnavailable.
+    con = get_read_connection() if read_only else get_connection()
+    target = _checked_out.get(id(con), (None, 'primary'))[1]
+    try:
+        yield con
+    except Exception as e:
+        if not _is_outage(e):
+            raise
+        _breaker_failure(target)
+        raise DatabaseUnavailable(str(e)) from e
+    else:
+        _breaker_success(target)
+    finally:
+        release_connection(con)
+
+# --- Degraded Reads ---
+LAST_GOOD_MAX_ENTRIES = 256
+
+@st.cache_resource
+def _last_good_results():
+    # (function, args) -> (result, fetched_at); served when the database is down
+    return {}
+
+def _degradable(default):
+    # Read functions return their last good result, flagged as stale, when the
+    # database is unavailable, or default() if they never succeeded.
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__name__, repr(args), repr(sorted(kwargs.items())))
+            try:
+                result = func(*args, **kwargs)
+            except DatabaseUnavailable as e:
+                # Keeps get_cached from storing a fallback as fresh data
+                _routing.degraded = True
+                last_good = _last_good_results().get(key)
+                if last_good is None:
+                    st.warning(f"Database unavailable, data not shown: {e}")
+                    return default()
+                result, fetched_at = last_good
+                st.warning(f"Database unavailable, showing stale data from {fetched_at:%H:%M:%S}.")
+                return result
+            last_good = _last_good_results()
+            last_good.pop(key, None)
+            last_good[key] = (result, datetime.now())
+            if len(last_good) > LAST_GOOD_MAX_ENTRIES:
+                last_good.pop(next(iter(last_good)))
+            return result
+        return wrapper
+    return decorator
+
+# --- Prepared Statements ---
+TRANSACTION_COLUMNS = "id, date, amount, type, comments, person, recurring_rule_id"
+
+# Hot queries are PREPAREd once per pooled connection and then run with EXECUTE,
+# skipping parse/plan on every call. name -> (parameter types, query with %s placeholders)
+PREPARED_STATEMENTS = {
+    # Monthly totals include archived years via archive_monthly. Hot rows are
+    # matched on [first day, next month's first day) so the date index applies.
+    'monthly_revenue_total': (['date', 'date', 'text'], """
+        SELECT SUM(amount) FROM (
+            SELECT amount FROM revenue
+            WHERE date >= %s AND date < %s
+            UNION ALL
+            SELECT total FROM archive_monthly
+            WHERE table_name = 'revenue' AND month = %s
+        ) t
+    """),
+    'monthly_expense_total': (['date', 'date', 'text'], """
+        SELECT SUM(amount) FROM (
+            SELECT amount FROM expenses
+            WHERE date >= %s AND date < %s
+            UNION ALL
+            SELECT total FROM archive_monthly
+            WHERE table_name = 'expenses' AND month = %s
+        ) t
+    """),
+    'monthly_budget': (['text'], "SELECT amount FROM budget WHERE month = %s"),
+    'expense_breakdown': (['date', 'date', 'text'], """
+        SELECT type, SUM(amount) as total
+        FROM (
+            SELECT type, amount FROM expenses
+            WHERE date >= %s AND date < %s
+            UNION ALL
+            SELECT NULLIF(type, ''), total FROM archive_monthly
+            WHERE table_name = 'expenses' AND month = %s
+        ) t
+        GROUP BY type
+        ORDER BY total DESC
+    """),
+    # Explicit columns: a prepared SELECT * breaks ("cached plan must not change
+    # result type") as soon as a migration adds a column
+    'expenses_in_range': (['date', 'date'], f"""
+        SELECT {TRANSACTION_COLUMNS} FROM expenses WHERE date BETWEEN %s AND %s ORDER BY date DESC
+    """),
+    'revenue_in_range': (['date', 'date'], f"""
+        SELECT {TRANSACTION_COLUMNS} FROM revenue WHERE date BETWEEN %s AND %s ORDER BY date DESC
+    """),
+    'insert_expense': (['date', 'numeric', 'text', 'text', 'text'], """
+        INSERT INTO expenses (date, amount, type, comments, person)
+        VALUES (%s, %s, %s, %s, %s)
+        RETURNING date
+    """),
+    'insert_revenue': (['date', 'numeric', 'text', 'text', 'text'], """
+        INSERT INTO revenue (date, amount, type, comments, person)
+        VALUES (%s, %s, %s, %s, %s)
+        RETURNING date
+    """),
+}
+
+# id(connection) -> (backend pid, names prepared on that session)
+_prepared_on = {}
+
+def _prepared_statements_enabled():
+    # Transaction-mode poolers (e.g. Supabase's port 6543) don't keep prepared
+    # statements between transactions; set use_prepared_statements = false for those.
+    secrets = _secrets_section('supabase')
+    if secrets is not None and 'use_prepared_statements' in secrets:
+        return bool(secrets['use_prepared_statements'])
+    return os.getenv("SUPABASE_PREPARED_STATEMENTS", "1").lower() not in ("0", "false", "no")
+
+def _ensure_prepared(cur, name):
+    con = cur.connection
+    pid = con.get_backend_pid()
+    known_pid, names = _prepared_on.get(id(con), (None, set()))
+    if known_pid != pid:
+        # New (or recycled) connection: nothing prepared on it yet
+        names = set()
+        _prepared_on[id(con)] = (pid, names)
+    if name not in names:
+        types, query = PREPARED_STATEMENTS[name]
+        counter = iter(range(1, len(types) + 1))
+        body = re.sub(r'%s', lambda m: f"${next(counter)}", query)
+        cur.execute(f"PREPARE {name} ({', '.join(types)}) AS {body}")
+        names.add(name)
+
+def execute_prepared(cur, name, params):
+    if not _prepared_statements_enabled():
+        cur.execute(PREPARED_STATEMENTS[name][1], params)
         return
-    
+    _ensure_prepared(cur, name)
+    placeholders = ', '.join(['%s'] * len(params))
+    try:
+        cur.execute(f"EXECUTE {name} ({placeholders})", params)
+    except psycopg2.Error:
+        _forget_prepared(cur.connection, name)
+        raise
+
+def _forget_prepared(con, name):
+    # A failed EXECUTE may mean the statement went stale (e.g. after a migration);
+    # drop it so the next call prepares it afresh
+    _prepared_on.get(id(con), (None, set()))[1].discard(name)
+    if con.closed:
+        return
+    try:
+        # The failed EXECUTE already aborted this transaction
+        con.rollback()
+        cur = con.cursor()
+        cur.execute(f"DEALLOCATE {name}")
+        cur.close()
+        con.rollback()
+    except psycopg2.Error:
+        # Never prepared, or the connection is gone; the pool cleans up either way
+        pass
+
+def read_prepared(con, name, params):
+    # Same result shape as pd.read_sql for a prepared statement
     cur = con.cursor()
+    execute_prepared(cur, name, params)
+    columns = [col[0] for col in cur.description]
+    df = pd.DataFrame.from_records(cur.fetchall(), columns=columns, coerce_float=True)
+    cur.close()
+    return df
+
+# --- Read Cache ---
+# Process-wide cache of read results and chart payloads shared by all sessions.
+# Each entry depends on tags such as "expenses:2024-05" (one table-month) or
+# "expenses:*" (anything in the table); a write bumps the tags it touches,
+# which invalidates exactly the entries built from that data. Writes from other
+# server processes arrive through the LISTEN/NOTIFY change listener below.
+
+READ_CACHE_MAX_ENTRIES = 512
+
+# Bumped when the change feed may have gaps; every entry depends on it
+ALL_TAG = '*'
+
+@st.cache_resource
+def _read_cache():
+    return {'lock': threading.Lock(), 'versions': {}, 'bumped_at': {}, 'entries': {}}
+
+def _entry_valid(versions, snapshot):
+    return all(versions.get(tag, 0) == version for tag, version in snapshot.items())
+
+def _as_of(month_str=None):
+    # Results reaching into the current month read CURRENT_DATE, so they change
+    # from one day to the next with no write to invalidate them; such keys carry
+    # today's date. month_str=None means "spans all months up to today".
+    today = date.today()
+    if month_str is None or month_str >= f"{today:%Y-%m}":
+        return today
+    return None
+
+def get_cached(key, tags, build):
+    cache = _read_cache()
+    _ensure_change_listener()
+    tags = list(tags) + [ALL_TAG]
+    with cache['lock']:
+        entry = cache['entries'].get(key)
+        if entry is not None and _entry_valid(cache['versions'], entry[0]):
+            return entry[1]
+        snapshot = {tag: cache['versions'].get(tag, 0) for tag in tags}
+        # Data changed moments ago: a replica may not have it yet
+        recent = any(time.time() - cache['bumped_at'].get(tag, 0) < _read_your_writes_seconds() for tag in tags)
+
+    # Builds can nest (an entry built from other entries); restore the outer state after
+    outer_force_primary = getattr(_routing, 'force_primary', False)
+    outer_degraded = getattr(_routing, 'degraded', False)
+    _routing.force_primary = recent or outer_force_primary
+    _routing.degraded = False
+    try:
+        value = build()
+    finally:
+        degraded = _routing.degraded
+        _routing.force_primary = outer_force_primary
+        _routing.degraded = outer_degraded or degraded
+
+    with cache['lock']:
+        # Skip storing if a write landed while we were building, or if the
+        # build fell back to stale data
+        if _entry_valid(cache['versions'], snapshot) and not degraded:
+            cache['entries'].pop(key, None)
+            cache['entries'][key] = (snapshot, value)
+            if len(cache['entries']) > READ_CACHE_MAX_ENTRIES:
+                cache['entries'].pop(next(iter(cache['entries'])))
+    return value
+
+def _bump_tags(cache, tags):
+    now = time.time()
+    with cache['lock']:
+        for tag in tags:
+            cache['versions'][tag] = cache['versions'].get(tag, 0) + 1
+            cache['bumped_at'][tag] = now
+        cache['entries'] = {
+            key: entry for key, entry in cache['entries'].items()
+            if _entry_valid(cache['versions'], entry[0])
+        }
+
+def _table_tags(table, months):
+    return [f"{table}:*"] + [f"{table}:{m}" for m in set(months) if m]
+
+def invalidate_cache(table, months):
+    _bump_tags(_read_cache(), _table_tags(table, months))
+
+def _month_str(date_val):
+    return date_val.strftime('%Y-%m') if date_val else None
+
+def _month_bounds(year, month):
+    # First day of the month and of the next one, for half-open date ranges
+    return date(year, month, 1), date(year + month // 12, month % 12 + 1, 1)
+
+def _month_tags(table, date_from, date_to):
+    # Tags for a date-range read; open or very long ranges depend on the whole table
+    if not date_from or not date_to or (date_to.year - date_from.year) * 12 + date_to.month - date_from.month > 24:
+        return [f"{table}:*"]
+    months = pd.period_range(date_from, date_to, freq='M')
+    return [f"{table}:{m.strftime('%Y-%m')}" for m in months]
+
+def _after_write(table, months):
+    _mark_write()
+    invalidate_cache(table, months)
+
+# --- Change Notifications ---
+# Writes NOTIFY the other server processes (inside the writing transaction, so
+# the event is only delivered on commit); each process runs one listener thread
+# that bumps the matching cache tags.
+CHANGE_CHANNEL = 'finance_changes'
+LISTENER_RECONNECT_SECONDS = 5
+# Quiet periods longer than this are checked with a ping
+LISTENER_PING_SECONDS = 60
+
+# Identifies this server process so the listener can skip its own events
+_PROCESS_ID = uuid.uuid4().hex
+
+def _publish_change(cur, table, months):
+    payload = json.dumps({'origin': _PROCESS_ID, 'table': table, 'months': sorted({m for m in months if m})})
+    cur.execute("SELECT pg_notify(%s, %s)", (CHANGE_CHANNEL, payload))
+
+def _apply_change(cache, payload):
+    try:
+        change = json.loads(payload)
+    except ValueError:
+        return
+    if change.get('origin') != _PROCESS_ID:
+        _bump_tags(cache, _table_tags(change['table'], change.get('months', [])))
+
+def _listen_for_changes(cache, params):
+    # Runs forever in a daemon thread; never touches Streamlit APIs
+    while True:
+        try:
+            # TCP keepalives catch a peer that vanished without closing the socket
+            con = psycopg2.connect(**params, keepalives=1, keepalives_idle=30,
+                                   keepalives_interval=10, keepalives_count=3)
+        except Exception:
+            time.sleep(LISTENER_RECONNECT_SECONDS)
+            continue
+        try:
+            con.autocommit = True
+            cur = con.cursor()
+            cur.execute(f"LISTEN {CHANGE_CHANNEL}")
+            # Events may have been missed while disconnected
+            _bump_tags(cache, [ALL_TAG])
+            while True:
+                if select.select([con], [], [], LISTENER_PING_SECONDS) == ([], [], []):
+                    # Nothing arrived: make sure we are still connected. This
+                    # raises on a dead connection, so the outer loop reconnects
+                    # and drops the whole cache.
+                    cur.execute("SELECT 1")
+                    continue
+                con.poll()
+                while con.notifies:
+                    _apply_change(cache, con.notifies.pop(0).payload)
+        except Exception:
+            time.sleep(LISTENER_RECONNECT_SECONDS)
+        finally:
+            con.close()
+
+@st.cache_resource
+def _change_listener():
+    # LISTEN needs a session-level connection to the primary (not a replica or
+    # a transaction-mode pooler)
+    listener = threading.Thread(
+        target=_listen_for_changes,
+        args=(_read_cache(), _connection_params('primary')),
+        name='finance-change-listener',
+        daemon=True,
+    )
+    listener.start()
+    return listener
+
+def _ensure_change_listener():
+    try:
+        _change_listener()
+    except Exception:
+        pass
+
+# chart name -> tags its payload depends on, given the selected "YYYY-MM"
+# (None for charts spanning all months)
+CHART_DEPENDENCIES = {
+    'expense_breakdown': lambda month_str: [f"expenses:{month_str}"],
+    'savings_trend': lambda month_str: ["expenses:*", "revenue:*"],
+    'budget_burndown': lambda month_str: [f"expenses:{month_str}", f"budget:{month_str}"],
+    'category_rolling': lambda month_str: ["expenses:*", "archive:*"],
+    'category_yoy': lambda month_str: ["expenses:*", "archive:*"],
+}
+
+# Charts whose data also depends on CURRENT_DATE (see _as_of)
+DATE_DEPENDENT_CHARTS = {'budget_burndown', 'category_rolling', 'category_yoy'}
+
+def get_chart_payload(chart, month_str, build):
+    # build() returns the figure as JSON (or None when there is nothing to plot)
+    as_of = _as_of(month_str) if chart in DATE_DEPENDENT_CHARTS else None
+    return get_cached(('chart', chart, month_str, as_of), CHART_DEPENDENCIES[chart](month_str), build)
+
+def init_db():
+    with _connection() as con:
+        cur = con.cursor()
     
-    # Create tables if they don't exist
-    # Postgres uses SERIAL for auto-increment
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS expenses (
-            id SERIAL PRIMARY KEY,
-            date DATE,
-            amount DECIMAL,
-            type TEXT,
-            comments TEXT,
-            person TEXT
-        );
-    """)
+        # Create tables if they don't exist
+        # Postgres uses SERIAL for auto-increment
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS expenses (
+                id SERIAL PRIMARY KEY,
+                date DATE,
+                amount DECIMAL,
+                type TEXT,
+                comments TEXT,
+                person TEXT
+            );
+        """)
     
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS revenue (
-            id SERIAL PRIMARY KEY,
-            date DATE,
-            amount DECIMAL,
-            type TEXT,
-            comments TEXT,
-            person TEXT
-        );
-    """)
-
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS budget (
-            id SERIAL PRIMARY KEY,
-            month TEXT, -- YYYY-MM
-            amount DECIMAL,
-            comments TEXT
-        );
-    """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS revenue (
+                id SERIAL PRIMARY KEY,
+                date DATE,
+                amount DECIMAL,
+                type TEXT,
+                comments TEXT,
+                person TEXT
+            );
+        """)
+
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS budget (
+                id SERIAL PRIMARY KEY,
+                month TEXT, -- YYYY-MM
+                amount DECIMAL,
+                comments TEXT
+            );
+        """)
     
-    con.commit()
-    cur.close()
-    con.close()
+        # Cold storage for closed years: one gzip-compressed CSV segment per
+        # (table, year) plus the per-month/type totals the dashboard needs
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS archive_segments (
+                table_name TEXT,
+                year INTEGER,
+                row_count INTEGER,
+                payload BYTEA,
+                archived_at TIMESTAMP DEFAULT NOW(),
+                PRIMARY KEY (table_name, year)
+            );
+        """)
+
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS archive_monthly (
+                table_name TEXT,
+                month TEXT, -- YYYY-MM
+                type TEXT, -- '' for rows without a type
+                total DECIMAL,
+                row_count INTEGER,
+                PRIMARY KEY (table_name, month, type)
+            );
+        """)
+    
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS recurring_rules (
+                id SERIAL PRIMARY KEY,
+                kind TEXT, -- 'expenses' or 'revenue'
+                amount DECIMAL,
+                type TEXT,
+                comments TEXT,
+                person TEXT,
+                cadence TEXT, -- key of RECURRING_CADENCES
+                start_date DATE,
+                end_date DATE -- NULL: no end
+            );
+        """)
+    
+        for table in TRANSACTION_TABLES:
+            # Generated occurrences point back at their rule; the unique index
+            # makes re-running the generator a no-op for existing occurrences
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS recurring_rule_id INTEGER")
+            cur.execute(f"""
+                CREATE UNIQUE INDEX IF NOT EXISTS {table}_recurring_occurrence_idx
+                ON {table} (recurring_rule_id, date) WHERE recurring_rule_id IS NOT NULL
+            """)
+    
+        # Composite indexes backing query_transactions' pushed-down filters
+        for table in TRANSACTION_TABLES:
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {table}_date_idx ON {table} (date)")
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {table}_person_date_idx ON {table} (person, date)")
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {table}_type_date_idx ON {table} (type, date)")
+    
+        con.commit()
+        cur.close()
 
 # --- Expenses ---
 def add_expense(date_val, amount, type_val, comments, person):
-    con = get_connection()
-    cur = con.cursor()
-    query = """
-    INSERT INTO expenses (date, amount, type, comments, person) 
-    VALUES (%s, %s, %s, %s, %s)
-    """
-    cur.execute(query, (date_val, amount, type_val, comments, person))
-    con.commit()
-    cur.close()
-    con.close()
+    with _connection() as con:
+        cur = con.cursor()
+        execute_prepared(cur, 'insert_expense', (date_val, amount, type_val, comments, person))
+        inserted_date = cur.fetchone()[0]
+        months = [_month_str(inserted_date)]
+        _publish_change(cur, 'expenses', months)
+        con.commit()
+        _after_write('expenses', months)
+        cur.close()
 
+@_degradable(pd.DataFrame)
 def get_expenses(start_date=None, end_date=None):
-    con = get_connection()
-    query = "SELECT * FROM expenses"
-    params = []
-    
-    if start_date and end_date:
-        query += " WHERE date BETWEEN %s AND %s"
-        params = [start_date, end_date]
-        
-    query += " ORDER BY date DESC"
-    df = pd.read_sql(query, con, params=params)
-    con.close()
-    return df
+    with _connection(read_only=True) as con:
+        if start_date and end_date:
+            df = read_prepared(con, 'expenses_in_range', (start_date, end_date))
+        else:
+            df = pd.read_sql("SELECT * FROM expenses ORDER BY date DESC", con)
+    # Archived years are only read when the range reaches into them
+    return _with_archive('expenses', df, start_date, end_date)
 
+@_degradable(pd.DataFrame)
 def get_expense_by_id(expense_id):
-    con = get_connection()
-    query = "SELECT * FROM expenses WHERE id = %s"
-    df = pd.read_sql(query, con, params=[expense_id])
-    con.close()
+    with _connection(read_only=True) as con:
+        query = "SELECT * FROM expenses WHERE id = %s"
+        df = pd.read_sql(query, con, params=[expense_id])
     return df
 
 def delete_expense(expense_id):
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("DELETE FROM expenses WHERE id = %s", (expense_id,))
-    con.commit()
-    cur.close()
-    con.close()
+    with _connection() as con:
+        cur = con.cursor()
+        cur.execute("DELETE FROM expenses WHERE id = %s RETURNING date", (expense_id,))
+        deleted = cur.fetchone()
+        months = [_month_str(deleted[0])] if deleted else []
+        _publish_change(cur, 'expenses', months)
+        con.commit()
+        _after_write('expenses', months)
+        cur.close()
+    # False when no hot row had that id (e.g. it was archived)
+    return deleted is not None
 
 def update_expense(expense_id, date_val, amount, type_val, comments, person):
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("""
-        UPDATE expenses 
-        SET date = %s, amount = %s, type = %s, comments = %s, person = %s
-        WHERE id = %s
-    """, (date_val, amount, type_val, comments, person, expense_id))
-    con.commit()
-    cur.close()
-    con.close()
+    with _connection() as con:
+        cur = con.cursor()
+        # Both the old and the new month change
+        cur.execute("SELECT date FROM expenses WHERE id = %s FOR UPDATE", (expense_id,))
+        old_row = cur.fetchone()
+        cur.execute("""
+            UPDATE expenses 
+            SET date = %s, amount = %s, type = %s, comments = %s, person = %s
+            WHERE id = %s
+            RETURNING date
+        """, (date_val, amount, type_val, comments, person, expense_id))
+        new_row = cur.fetchone()
+        months = [_month_str(row[0]) for row in (old_row, new_row) if row]
+        _publish_change(cur, 'expenses', months)
+        con.commit()
+        _after_write('expenses', months)
+        cur.close()
 
 
 # --- Revenue ---
 def add_revenue(date_val, amount, type_val, comments, person):
-    con = get_connection()
-    cur = con.cursor()
-    query = """
-    INSERT INTO revenue (date, amount, type, comments, person) 
-    VALUES (%s, %s, %s, %s, %s)
-    """
-    cur.execute(query, (date_val, amount, type_val, comments, person))
-    con.commit()
-    cur.close()
-    con.close()
+    with _connection() as con:
+        cur = con.cursor()
+        execute_prepared(cur, 'insert_revenue', (date_val, amount, type_val, comments, person))
+        inserted_date = cur.fetchone()[0]
+        months = [_month_str(inserted_date)]
+        _publish_change(cur, 'revenue', months)
+        con.commit()
+        _after_write('revenue', months)
+        cur.close()
 
+@_degradable(pd.DataFrame)
 def get_revenue(start_date=None, end_date=None):
-    con = get_connection()
-    query = "SELECT * FROM revenue"
-    params = []
-    if start_date and end_date:
-        query += " WHERE date BETWEEN %s AND %s"
-        params = [start_date, end_date]
-    query += " ORDER BY date DESC"
-    df = pd.read_sql(query, con, params=params)
-    con.close()
-    return df
+    with _connection(read_only=True) as con:
+        if start_date and end_date:
+            df = read_prepared(con, 'revenue_in_range', (start_date, end_date))
+        else:
+            df = pd.read_sql("SELECT * FROM revenue ORDER BY date DESC", con)
+    # Archived years are only read when the range reaches into them
+    return _with_archive('revenue', df, start_date, end_date)
 
+@_degradable(pd.DataFrame)
 def get_revenue_by_id(revenue_id):
-    con = get_connection()
-    query = "SELECT * FROM revenue WHERE id = %s"
-    df = pd.read_sql(query, con, params=[revenue_id])
-    con.close()
+    with _connection(read_only=True) as con:
+        query = "SELECT * FROM revenue WHERE id = %s"
+        df = pd.read_sql(query, con, params=[revenue_id])
     return df
 
 def delete_revenue(revenue_id):
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("DELETE FROM revenue WHERE id = %s", (revenue_id,))
-    con.commit()
-    cur.close()
-    con.close()
+    with _connection() as con:
+        cur = con.cursor()
+        cur.execute("DELETE FROM revenue WHERE id = %s RETURNING date", (revenue_id,))
+        deleted = cur.fetchone()
+        months = [_month_str(deleted[0])] if deleted else []
+        _publish_change(cur, 'revenue', months)
+        con.commit()
+        _after_write('revenue', months)
+        cur.close()
+    # False when no hot row had that id (e.g. it was archived)
+    return deleted is not None
     
 def update_revenue(revenue_id, date_val, amount, type_val, comments, person):
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("""
-        UPDATE revenue 
-        SET date = %s, amount = %s, type = %s, comments = %s, person = %s
-        WHERE id = %s
-    """, (date_val, amount, type_val, comments, person, revenue_id))
-    con.commit()
-    cur.close()
-    con.close()
+    with _connection() as con:
+        cur = con.cursor()
+        # Both the old and the new month change
+        cur.execute("SELECT date FROM revenue WHERE id = %s FOR UPDATE", (revenue_id,))
+        old_row = cur.fetchone()
+        cur.execute("""
+            UPDATE revenue 
+            SET date = %s, amount = %s, type = %s, comments = %s, person = %s
+            WHERE id = %s
+            RETURNING date
+        """, (date_val, amount, type_val, comments, person, revenue_id))
+        new_row = cur.fetchone()
+        months = [_month_str(row[0]) for row in (old_row, new_row) if row]
+        _publish_change(cur, 'revenue', months)
+        con.commit()
+        _after_write('revenue', months)
+        cur.close()
+
+# --- Filtered Transactions ---
+TRANSACTION_TABLES = ('expenses', 'revenue')
+
+# order_by key -> ORDER BY clause (never interpolate user input into SQL)
+TRANSACTION_ORDERINGS = {
+    'date_desc': 'date DESC, id DESC',
+    'date_asc': 'date ASC, id ASC',
+    'amount_desc': 'amount DESC, id DESC',
+    'amount_asc': 'amount ASC, id ASC',
+}
+
+# Same orderings for archived rows merged in pandas: key -> (columns, ascending)
+FRAME_ORDERINGS = {
+    'date_desc': (['date', 'id'], False),
+    'date_asc': (['date', 'id'], True),
+    'amount_desc': (['amount', 'id'], False),
+    'amount_asc': (['amount', 'id'], True),
+}
+
+@_degradable(pd.DataFrame)
+def query_transactions(kind, date_from=None, date_to=None, persons=None, types=None,
+                       min_amount=None, max_amount=None, order_by='date_desc', limit=None):
+    # All filters are pushed down into one parameterized query; empty/None means "any"
+    if kind not in TRANSACTION_TABLES:
+        raise ValueError(f"Unknown transaction kind: {kind}")
+    if order_by not in TRANSACTION_ORDERINGS:
+        raise ValueError(f"Unknown ordering: {order_by}")
+
+    conditions = []
+    params = []
+    if date_from:
+        conditions.append("date >= %s")
+        params.append(date_from)
+    if date_to:
+        conditions.append("date <= %s")
+        params.append(date_to)
+    if persons:
+        conditions.append("person = ANY(%s)")
+        params.append(list(persons))
+    if types:
+        conditions.append("type = ANY(%s)")
+        params.append(list(types))
+    if min_amount is not None:
+        conditions.append("amount >= %s")
+        params.append(min_amount)
+    if max_amount is not None:
+        conditions.append("amount <= %s")
+        params.append(max_amount)
+
+    query = f"SELECT * FROM {kind}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += f" ORDER BY {TRANSACTION_ORDERINGS[order_by]}"
+    if limit:
+        query += " LIMIT %s"
+        params.append(int(limit))
+
+    def run_query():
+        with _connection(read_only=True) as con:
+            hot = pd.read_sql(query, con, params=params)
+        cold = _filter_frame(_read_archive(kind, date_from, date_to), persons, types, min_amount, max_amount)
+        if cold.empty:
+            return hot
+        columns, ascending = FRAME_ORDERINGS[order_by]
+        df = pd.concat([hot, cold], ignore_index=True).sort_values(columns, ascending=ascending, ignore_index=True)
+        return df.head(int(limit)) if limit else df
+
+    # Cached until a write touches one of the months in range
+    tags = _month_tags(kind, date_from, date_to) + ['archive:*']
+    return get_cached(('transactions', query, repr(params)), tags, run_query)
 
 # --- Budget ---
 def add_budget(month_str, amount, comments):
-    con = get_connection()
-    cur = con.cursor()
-    # Check if exists first to avoid duplicates or update?
-    # For now, just insert as requested, but maybe unique constraint on month?
-    # Let's stick to insert for now to match previous logic, but user can edit now.
-    query = """
-    INSERT INTO budget (month, amount, comments) 
-    VALUES (%s, %s, %s)
-    """
-    cur.execute(query, (month_str, amount, comments))
-    con.commit()
-    cur.close()
-    con.close()
+    with _connection() as con:
+        cur = con.cursor()
+        # Check if exists first to avoid duplicates or update?
+        # For now, just insert as requested, but maybe unique constraint on month?
+        # Let's stick to insert for now to match previous logic, but user can edit now.
+        query = """
+        INSERT INTO budget (month, amount, comments) 
+        VALUES (%s, %s, %s)
+        """
+        cur.execute(query, (month_str, amount, comments))
+        months = [month_str]
+        _publish_change(cur, 'budget', months)
+        con.commit()
+        _after_write('budget', months)
+        cur.close()
 
+@_degradable(pd.DataFrame)
 def get_budgets():
-    con = get_connection()
-    df = pd.read_sql("SELECT * FROM budget ORDER BY month DESC", con)
-    con.close()
+    return get_cached(('budgets',), ['budget:*'], _query_budgets)
+
+def _query_budgets():
+    with _connection(read_only=True) as con:
+        df = pd.read_sql("SELECT * FROM budget ORDER BY month DESC", con)
     return df
 
+@_degradable(pd.DataFrame)
 def get_budget_by_id(budget_id):
-    con = get_connection()
-    query = "SELECT * FROM budget WHERE id = %s"
-    df = pd.read_sql(query, con, params=[budget_id])
-    con.close()
+    with _connection(read_only=True) as con:
+        query = "SELECT * FROM budget WHERE id = %s"
+        df = pd.read_sql(query, con, params=[budget_id])
     return df
 
 def delete_budget(budget_id):
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("DELETE FROM budget WHERE id = %s", (budget_id,))
-    con.commit()
-    cur.close()
-    con.close()
+    with _connection() as con:
+        cur = con.cursor()
+        cur.execute("DELETE FROM budget WHERE id = %s RETURNING month", (budget_id,))
+        deleted = cur.fetchone()
+        months = [deleted[0]] if deleted else []
+        _publish_change(cur, 'budget', months)
+        con.commit()
+        _after_write('budget', months)
+        cur.close()
     
 def update_budget(budget_id, month_str, amount, comments):
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("""
-        UPDATE budget 
-        SET month = %s, amount = %s, comments = %s
-        WHERE id = %s
-    """, (month_str, amount, comments, budget_id))
-    con.commit()
-    cur.close()
-    con.close()
+    with _connection() as con:
+        cur = con.cursor()
+        cur.execute("SELECT month FROM budget WHERE id = %s FOR UPDATE", (budget_id,))
+        old_row = cur.fetchone()
+        cur.execute("""
+            UPDATE budget 
+            SET month = %s, amount = %s, comments = %s
+            WHERE id = %s
+        """, (month_str, amount, comments, budget_id))
+        months = [month_str] + ([old_row[0]] if old_row else [])
+        _publish_change(cur, 'budget', months)
+        con.commit()
+        _after_write('budget', months)
+        cur.close()
+
+# --- Recurring Transactions ---
+# cadence -> (step between occurrences, fewest days a step can span); the day
+# count only bounds generate_series, occurrences are always start + n * step so
+# e.g. a rule starting on the 31st stays on month ends.
+RECURRING_CADENCES = {
+    'weekly': ('1 week', 7),
+    'monthly': ('1 month', 28),
+    'quarterly': ('3 months', 89),
+    'yearly': ('1 year', 365),
+}
+
+def add_recurring_rule(kind, amount, type_val, comments, person, cadence, start_date, end_date=None):
+    if kind not in TRANSACTION_TABLES:
+        raise ValueError(f"Unknown transaction kind: {kind}")
+    if cadence not in RECURRING_CADENCES:
+        raise ValueError(f"Unknown cadence: {cadence}")
+    with _connection() as con:
+        cur = con.cursor()
+        cur.execute("""
+            INSERT INTO recurring_rules (kind, amount, type, comments, person, cadence, start_date, end_date)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, (kind, amount, type_val, comments, person, cadence, start_date, end_date))
+        _publish_change(cur, 'recurring_rules', [])
+        con.commit()
+        _after_write('recurring_rules', [])
+        cur.close()
+
+@_degradable(pd.DataFrame)
+def get_recurring_rules():
+    return get_cached(('recurring_rules',), ['recurring_rules:*'], _query_recurring_rules)
+
+def _query_recurring_rules():
+    with _connection(read_only=True) as con:
+        df = pd.read_sql("SELECT * FROM recurring_rules ORDER BY kind, start_date", con)
+    return df
+
+def delete_recurring_rule(rule_id):
+    # Occurrences already generated are kept
+    with _connection() as con:
+        cur = con.cursor()
+        cur.execute("DELETE FROM recurring_rules WHERE id = %s", (rule_id,))
+        _publish_change(cur, 'recurring_rules', [])
+        con.commit()
+        _after_write('recurring_rules', [])
+        cur.close()
+
+def generate_recurring(date_from, date_to):
+    # Materialises every due occurrence of every rule within [date_from, date_to]
+    # in a single INSERT ... SELECT over generate_series. Idempotent: occurrences
+    # that already exist are skipped, and archived years are left alone.
+    cadences = ", ".join(
+        f"('{name}', INTERVAL '{step}', {min_days})" for name, (step, min_days) in RECURRING_CADENCES.items()
+    )
+    inserts = ",\n".join(f"""
+            inserted_{table} AS (
+                INSERT INTO {table} (date, amount, type, comments, person, recurring_rule_id)
+                SELECT date, amount, type, comments, person, rule_id
+                FROM due
+                WHERE kind = '{table}'
+                ON CONFLICT (recurring_rule_id, date) WHERE recurring_rule_id IS NOT NULL DO NOTHING
+                RETURNING '{table}'::text AS kind, date
+            )""" for table in TRANSACTION_TABLES)
+    inserted = " UNION ALL ".join(f"SELECT * FROM inserted_{table}" for table in TRANSACTION_TABLES)
+
+    with _connection() as con:
+        cur = con.cursor()
+        cur.execute(f"""
+            WITH cadences (cadence, step, min_days) AS (
+                VALUES {cadences}
+            ),
+            due AS (
+                SELECT r.id AS rule_id, r.kind, r.amount, r.type, r.comments, r.person,
+                       (r.start_date + n * c.step)::date AS date
+                FROM recurring_rules r
+                JOIN cadences c ON c.cadence = r.cadence
+                CROSS JOIN LATERAL generate_series(
+                    0, (LEAST(COALESCE(r.end_date, %(date_to)s), %(date_to)s) - r.start_date) / c.min_days
+                ) AS n
+                WHERE (r.start_date + n * c.step)::date BETWEEN %(date_from)s AND %(date_to)s
+                  AND (r.end_date IS NULL OR (r.start_date + n * c.step)::date <= r.end_date)
+                  AND NOT EXISTS (
+                      SELECT 1 FROM archive_segments a
+                      WHERE a.table_name = r.kind
+                        AND a.year = EXTRACT(YEAR FROM r.start_date + n * c.step)
+                  )
+            ),
+            {inserts}
+            SELECT kind, TO_CHAR(date, 'YYYY-MM'), COUNT(*)
+            FROM ({inserted}) t
+            GROUP BY 1, 2
+        """, {'date_from': date_from, 'date_to': date_to})
+        counts = cur.fetchall()
+
+        months_by_table = {}
+        for table, month, _ in counts:
+            months_by_table.setdefault(table, []).append(month)
+        for table, months in months_by_table.items():
+            _publish_change(cur, table, months)
+        con.commit()
+        for table, months in months_by_table.items():
+            _after_write(table, months)
+        cur.close()
+    return sum(count for _, _, count in counts)
+
+# --- Archive ---
+# Closed years can be moved out of expenses/revenue into archive_segments.
+# Monthly totals stay queryable through archive_monthly, and the read functions
+# above merge archived rows back in only when a range reaches an archived year.
+# Archived rows keep their ids but can no longer be edited or deleted.
+
+def archive_year(table, year):
+    if table not in TRANSACTION_TABLES:
+        raise ValueError(f"Unknown transaction kind: {table}")
+    if year >= date.today().year:
+        raise ValueError(f"{year} is not closed yet; only past years can be archived")
+
+    with _connection() as con:
+        cur = con.cursor()
+        # Move rows and fold their totals into archive_monthly in one statement,
+        # so nothing inserted concurrently is deleted without being counted
+        cur.execute(f"""
+            WITH moved AS (
+                DELETE FROM {table}
+                WHERE date >= %s AND date < %s
+                RETURNING *
+            ), totals AS (
+                INSERT INTO archive_monthly (table_name, month, type, total, row_count)
+                SELECT %s, TO_CHAR(date, 'YYYY-MM'), COALESCE(type, ''), SUM(amount), COUNT(*)
+                FROM moved
+                GROUP BY 2, 3
+                ON CONFLICT (table_name, month, type) DO UPDATE
+                SET total = archive_monthly.total + EXCLUDED.total,
+                    row_count = archive_monthly.row_count + EXCLUDED.row_count
+            )
+            SELECT * FROM moved
+        """, (date(year, 1, 1), date(year + 1, 1, 1), table))
+        columns = [col[0] for col in cur.description]
+        moved = pd.DataFrame.from_records(cur.fetchall(), columns=columns, coerce_float=True)
+
+        if moved.empty:
+            cur.close()
+            return 0
+
+        cur.execute("SELECT payload FROM archive_segments WHERE table_name = %s AND year = %s FOR UPDATE", (table, year))
+        existing = cur.fetchone()
+        if existing:
+            # Rows added to the year after an earlier archive run
+            moved = pd.concat([_decode_segment(existing[0]), moved], ignore_index=True)
+
+        cur.execute("""
+            INSERT INTO archive_segments (table_name, year, row_count, payload)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (table_name, year) DO UPDATE
+            SET row_count = EXCLUDED.row_count, payload = EXCLUDED.payload, archived_at = NOW()
+        """, (table, year, len(moved), psycopg2.Binary(_encode_segment(moved))))
+
+        months = [f"{year}-{m:02d}" for m in range(1, 13)]
+        _publish_change(cur, table, months)
+        _publish_change(cur, 'archive', [])
+        con.commit()
+        _after_write(table, months)
+        _after_write('archive', [])
+        cur.close()
+    return len(moved)
+
+# Written for NULL so it stays distinct from an empty string, as in COPY's text format
+SEGMENT_NULL = r'\N'
+SEGMENT_DTYPES = {'id': 'Int64', 'recurring_rule_id': 'Int64', 'type': str, 'comments': str, 'person': str}
+
+def _encode_segment(df):
+    return gzip.compress(df.to_csv(index=False, na_rep=SEGMENT_NULL).encode('utf-8'))
+
+def _decode_segment(payload):
+    df = pd.read_csv(io.BytesIO(gzip.decompress(bytes(payload))), dtype=SEGMENT_DTYPES,
+                     keep_default_na=False, na_values=[SEGMENT_NULL])
+    # Match what psycopg2 returns for the hot tables: plain ints and strings, None for NULL
+    df['date'] = pd.to_datetime(df['date']).dt.date
+    for col in SEGMENT_DTYPES:
+        if col in df.columns:
+            df[col] = df[col].astype(object).where(df[col].notna(), None)
+    return df
+
+@_degradable(pd.DataFrame)
+def get_archive_segments():
+    return get_cached(('archive_segments',), ['archive:*'], _query_archive_segments)
+
+def _query_archive_segments():
+    with _connection(read_only=True) as con:
+        df = pd.read_sql("""
+            SELECT table_name, year, row_count, LENGTH(payload) AS compressed_bytes, archived_at
+            FROM archive_segments
+            ORDER BY table_name, year
+        """, con)
+    return df
+
+def _archived_years(table):
+    segments = get_cached(('archive_segments',), ['archive:*'], _query_archive_segments)
+    return sorted(segments.loc[segments['table_name'] == table, 'year'].astype(int))
+
+def _load_segment(table, year):
+    def load():
+        with _connection(read_only=True) as con:
+            cur = con.cursor()
+            cur.execute("SELECT payload FROM archive_segments WHERE table_name = %s AND year = %s", (table, year))
+            row = cur.fetchone()
+            cur.close()
+        return _decode_segment(row[0]) if row else pd.DataFrame()
+    return get_cached(('archive_segment', table, year), ['archive:*'], load)
+
+def _read_archive(table, date_from=None, date_to=None):
+    # Archived rows of table within [date_from, date_to]; cheap when no archived year is touched
+    years = [
+        year for year in _archived_years(table)
+        if (not date_from or year >= date_from.year) and (not date_to or year <= date_to.year)
+    ]
+    if not years:
+        return pd.DataFrame()
+    df = pd.concat([_load_segment(table, year) for year in years], ignore_index=True)
+    if date_from:
+        df = df[df['date'] >= date_from]
+    if date_to:
+        df = df[df['date'] <= date_to]
+    return df
+
+def _filter_frame(df, persons=None, types=None, min_amount=None, max_amount=None):
+    # query_transactions' predicates, applied to archived rows
+    if df.empty:
+        return df
+    if persons:
+        df = df[df['person'].isin(persons)]
+    if types:
+        df = df[df['type'].isin(types)]
+    if min_amount is not None:
+        df = df[df['amount'] >= min_amount]
+    if max_amount is not None:
+        df = df[df['amount'] <= max_amount]
+    return df
+
+def _with_archive(table, hot, date_from=None, date_to=None):
+    # Like the hot query, anything but a full range means all dates
+    if not (date_from and date_to):
+        date_from = date_to = None
+    cold = _read_archive(table, date_from, date_to)
+    if cold.empty:
+        return hot
+    df = pd.concat([hot, cold], ignore_index=True)
+    return df.sort_values('date', ascending=False, ignore_index=True)
 
 # --- Dashboard Helpers ---
+@_degradable(lambda: (0.0, 0.0, 0.0))
 def get_monthly_summary(year, month):
-    con = get_connection()
-    if not con:
-        return 0.0, 0.0, 0.0
-    cur = con.cursor()
     month_str = f"{year}-{month:02d}"
+    tags = [f"expenses:{month_str}", f"revenue:{month_str}", f"budget:{month_str}"]
+    return get_cached(('monthly_summary', month_str), tags, lambda: _query_monthly_summary(year, month))
+
+def _query_monthly_summary(year, month):
+    month_str = f"{year}-{month:02d}"
+    first_day, next_month = _month_bounds(year, month)
+    with _connection(read_only=True) as con:
+        cur = con.cursor()
     
-    # Postgres: TO_CHAR(date, 'YYYY-MM')
-    rev_query = """
-        SELECT SUM(amount) FROM revenue 
-        WHERE TO_CHAR(date, 'YYYY-MM') = %s
-    """
-    cur.execute(rev_query, (month_str,))
-    res = cur.fetchone()
-    total_rev = res[0] if res and res[0] else 0.0
+        execute_prepared(cur, 'monthly_revenue_total', (first_day, next_month, month_str))
+        res = cur.fetchone()
+        total_rev = res[0] if res and res[0] else 0.0
     
-    exp_query = """
-        SELECT SUM(amount) FROM expenses 
-        WHERE TO_CHAR(date, 'YYYY-MM') = %s
-    """
-    cur.execute(exp_query, (month_str,))
-    res = cur.fetchone()
-    total_exp = res[0] if res and res[0] else 0.0
+        execute_prepared(cur, 'monthly_expense_total', (first_day, next_month, month_str))
+        res = cur.fetchone()
+        total_exp = res[0] if res and res[0] else 0.0
     
-    bud_query = "SELECT amount FROM budget WHERE month = %s"
-    cur.execute(bud_query, (month_str,))
-    res = cur.fetchone()
-    budget_amt = res[0] if res and res[0] else 0.0
+        execute_prepared(cur, 'monthly_budget', (month_str,))
+        res = cur.fetchone()
+        budget_amt = res[0] if res and res[0] else 0.0
     
-    cur.close()
-    con.close()
+        cur.close()
     return float(total_rev), float(total_exp), float(budget_amt)
     
+@_degradable(lambda: pd.DataFrame(columns=['month', 'savings']))
 def get_monthly_savings_trend():
-    con = get_connection()
-    
-    rev_df = pd.read_sql("""
-        SELECT TO_CHAR(date, 'YYYY-MM') as month, SUM(amount) as revenue
-        FROM revenue
-        GROUP BY 1
-    """, con)
+    with _connection(read_only=True) as con:
+        rev_df = pd.read_sql("""
+            SELECT month, SUM(amount) as revenue
+            FROM (
+                SELECT TO_CHAR(date, 'YYYY-MM') as month, amount FROM revenue
+                UNION ALL
+                SELECT month, total FROM archive_monthly WHERE table_name = 'revenue'
+            ) t
+            GROUP BY 1
+        """, con)
     
-    exp_df = pd.read_sql("""
-        SELECT TO_CHAR(date, 'YYYY-MM') as month, SUM(amount) as expenses
-        FROM expenses
-        GROUP BY 1
-    """, con)
-    
-    con.close()
+        exp_df = pd.read_sql("""
+            SELECT month, SUM(amount) as expenses
+            FROM (
+                SELECT TO_CHAR(date, 'YYYY-MM') as month, amount FROM expenses
+                UNION ALL
+                SELECT month, total FROM archive_monthly WHERE table_name = 'expenses'
+            ) t
+            GROUP BY 1
+        """, con)
     
     if rev_df.empty and exp_df.empty:
         return pd.DataFrame(columns=['month', 'savings'])
@@ -297,20 +1308,138 @@ def get_monthly_savings_trend():
     df = df.sort_values('month')
     return df
 
+@_degradable(lambda: pd.DataFrame(columns=['type', 'total']))
 def get_expense_breakdown(year, month):
-    con = get_connection()
     month_str = f"{year}-{month:02d}"
-    query = """
-        SELECT type, SUM(amount) as total
-        FROM expenses
-        WHERE TO_CHAR(date, 'YYYY-MM') = %s
-        GROUP BY type
-        ORDER BY total DESC
+    first_day, next_month = _month_bounds(year, month)
+    with _connection(read_only=True) as con:
+        df = read_prepared(con, 'expense_breakdown', (first_day, next_month, month_str))
+    return df
+
+# --- Analytics ---
+# Heavier trend analysis done entirely in SQL window functions, returning small
+# frames ready to plot. Category series include archived years via archive_monthly.
+
+def _category_months_sql(table):
+    # CTEs yielding one row per (calendar month, category) from the first month
+    # with data through the current month, zero-filled so ROWS-based windows
+    # span real months.
+    if table not in TRANSACTION_TABLES:
+        raise ValueError(f"Unknown transaction kind: {table}")
+    return f"""
+        monthly AS (
+            SELECT date_trunc('month', date)::date AS month, COALESCE(type, '') AS type, SUM(amount) AS total
+            FROM {table}
+            GROUP BY 1, 2
+            UNION ALL
+            SELECT to_date(month, 'YYYY-MM'), type, total
+            FROM archive_monthly
+            WHERE table_name = '{table}'
+        ),
+        totals AS (
+            SELECT month, type, SUM(total) AS total FROM monthly GROUP BY 1, 2
+        ),
+        bounds AS (
+            SELECT MIN(month) AS first_month,
+                   GREATEST(MAX(month), date_trunc('month', CURRENT_DATE)::date) AS last_month
+            FROM totals
+        ),
+        calendar AS (
+            SELECT g::date AS month
+            FROM bounds, generate_series(bounds.first_month, bounds.last_month, INTERVAL '1 month') AS g
+        ),
+        grid AS (
+            SELECT c.month, t.type, COALESCE(m.total, 0) AS total
+            FROM calendar c
+            CROSS JOIN (SELECT DISTINCT type FROM totals) t
+            LEFT JOIN totals m ON m.month = c.month AND m.type = t.type
+        )
     """
-    df = pd.read_sql(query, con, params=[month_str])
-    con.close()
+
+def _read_analytics(query, params):
+    with _connection(read_only=True) as con:
+        df = pd.read_sql(query, con, params=params)
     return df
 
+@_degradable(lambda: pd.DataFrame(columns=['month', 'type', 'total', 'avg_3m', 'avg_12m']))
+def get_category_rolling_averages(months=12, table='expenses'):
+    # Per-category monthly totals with rolling 3- and 12-month averages, last `months` months
+    query = f"""
+        WITH {_category_months_sql(table)},
+        rolling AS (
+            SELECT month, type, total,
+                   AVG(total) OVER (PARTITION BY type ORDER BY month ROWS BETWEEN 2 PRECEDING AND CURRENT ROW) AS avg_3m,
+                   AVG(total) OVER (PARTITION BY type ORDER BY month ROWS BETWEEN 11 PRECEDING AND CURRENT ROW) AS avg_12m
+            FROM grid
+        )
+        SELECT TO_CHAR(month, 'YYYY-MM') AS month, NULLIF(type, '') AS type, total, avg_3m, avg_12m
+        FROM rolling
+        WHERE month > (SELECT last_month FROM bounds) - %s * INTERVAL '1 month'
+        ORDER BY month, type
+    """
+    # The window ends at the current month at the earliest
+    return get_cached(('category_rolling', table, months, _as_of()), [f"{table}:*", 'archive:*'],
+                      lambda: _read_analytics(query, [int(months)]))
+
+@_degradable(lambda: pd.DataFrame(columns=['type', 'total', 'prev_year_total', 'yoy_delta', 'yoy_pct']))
+def get_category_yoy(year, month, table='expenses'):
+    # Each category's total for the month against the same month a year earlier
+    query = f"""
+        WITH {_category_months_sql(table)},
+        yoy AS (
+            SELECT month, type, total,
+                   LAG(total, 12) OVER (PARTITION BY type ORDER BY month) AS prev_year_total
+            FROM grid
+        )
+        SELECT NULLIF(type, '') AS type, total, COALESCE(prev_year_total, 0) AS prev_year_total,
+               total - COALESCE(prev_year_total, 0) AS yoy_delta,
+               ROUND((total - prev_year_total) / NULLIF(prev_year_total, 0) * 100, 1) AS yoy_pct
+        FROM yoy
+        WHERE month = %s AND (total <> 0 OR prev_year_total <> 0)
+        ORDER BY total DESC
+    """
+    # The zero-filled grid only reaches months up to the current one
+    return get_cached(('category_yoy', table, year, month, _as_of(f"{year}-{month:02d}")), [f"{table}:*", 'archive:*'],
+                      lambda: _read_analytics(query, [date(year, month, 1)]))
+
+@_degradable(lambda: pd.DataFrame(columns=['day', 'spent', 'cumulative_spent', 'remaining', 'ideal_remaining']))
+def get_budget_burndown(year, month):
+    # Daily cumulative spend against the month's budget, with the straight-line
+    # ideal for comparison. Archived months only keep monthly totals, so their
+    # days show no spend.
+    month_str = f"{year}-{month:02d}"
+    first_day, next_month = _month_bounds(year, month)
+    query = """
+        WITH days AS (
+            SELECT g::date AS day
+            FROM generate_series(%(first_day)s::date, %(next_month)s::date - 1, INTERVAL '1 day') AS g
+        ),
+        spend AS (
+            SELECT date, SUM(amount) AS spent
+            FROM expenses
+            WHERE date >= %(first_day)s AND date < %(next_month)s
+            GROUP BY date
+        ),
+        budget_amount AS (
+            SELECT COALESCE((SELECT amount FROM budget WHERE month = %(month_str)s ORDER BY id LIMIT 1), 0) AS amount
+        )
+        SELECT d.day,
+               COALESCE(s.spent, 0) AS spent,
+               SUM(COALESCE(s.spent, 0)) OVER w AS cumulative_spent,
+               -- Days still ahead have no actuals yet
+               CASE WHEN d.day <= CURRENT_DATE THEN b.amount - SUM(COALESCE(s.spent, 0)) OVER w END AS remaining,
+               b.amount * (1 - (ROW_NUMBER() OVER w)::numeric / COUNT(*) OVER ()) AS ideal_remaining
+        FROM days d
+        LEFT JOIN spend s ON s.date = d.day
+        CROSS JOIN budget_amount b
+        WINDOW w AS (ORDER BY d.day)
+        ORDER BY d.day
+    """
+    params = {'first_day': first_day, 'next_month': next_month, 'month_str': month_str}
+    # "remaining" is only filled in up to CURRENT_DATE
+    return get_cached(('budget_burndown', month_str, _as_of(month_str)), [f"expenses:{month_str}", f"budget:{month_str}"],
+                      lambda: _read_analytics(query, params))
+
 # Initialize DB on import (only if secrets exist, otherwise might fail silently or log error)
 try:
     init_db()
@@ -14,7 +14,36 @@ if 'last_person' not in st.session_state:
 def format_currency(amount):
     return f"₹ {amount:,.0f}"
 
-tab_expenses, tab_revenue = st.tabs(["💸 Expenses", "💰 Revenue"])
+SORT_OPTIONS = {
+    "Newest first": "date_desc",
+    "Oldest first": "date_asc",
+    "Largest amount": "amount_desc",
+    "Smallest amount": "amount_asc",
+}
+
+def history_filters(prefix, type_label, type_options):
+    # Extra filters pushed down to db.query_transactions; empty selections mean "all"
+    col_f3, col_f4, col_f5, col_f6 = st.columns(4)
+    with col_f3:
+        persons = st.multiselect("Person", ["Yateesh", "Prasanna"], key=f"{prefix}_f_persons")
+    with col_f4:
+        types = st.multiselect(type_label, type_options, key=f"{prefix}_f_types")
+    with col_f5:
+        min_amount = st.number_input("Min Amount", min_value=0.0, step=100.0, key=f"{prefix}_f_min")
+        max_amount = st.number_input("Max Amount (0 = no limit)", min_value=0.0, step=100.0, key=f"{prefix}_f_max")
+    with col_f6:
+        sort_label = st.selectbox("Sort", list(SORT_OPTIONS), key=f"{prefix}_f_sort")
+        limit = st.number_input("Max Rows (0 = all)", min_value=0, step=50, key=f"{prefix}_f_limit")
+    return {
+        "persons": persons,
+        "types": types,
+        "min_amount": min_amount if min_amount > 0 else None,
+        "max_amount": max_amount if max_amount > 0 else None,
+        "order_by": SORT_OPTIONS[sort_label],
+        "limit": limit or None,
+    }
+
+tab_expenses, tab_revenue, tab_recurring = st.tabs(["💸 Expenses", "💰 Revenue", "🔁 Recurring"])
 
 # --- EXPENSES TAB ---
 with tab_expenses:
@@ -34,11 +63,15 @@ with tab_expenses:
         submitted_e = st.form_submit_button("Add Expense")
         if submitted_e:
             if e_amount > 0:
-                db.add_expense(e_date, e_amount, e_type, e_comments, e_person)
-                # Update session state
-                st.session_state.last_person = e_person
-                st.success(f"Expense added for {e_person}!")
-                st.rerun()
+                try:
+                    db.add_expense(e_date, e_amount, e_type, e_comments, e_person)
+                except db.DatabaseUnavailable as e:
+                    st.error(f"Could not save changes: {e}")
+                else:
+                    # Update session state
+                    st.session_state.last_person = e_person
+                    st.success(f"Expense added for {e_person}!")
+                    st.rerun()
             else:
                 st.error("Amount must be positive.")
 
@@ -49,8 +82,9 @@ with tab_expenses:
         start_date = st.date_input("From", value=date(date.today().year, date.today().month, 1), key="e_start")
     with col_f2:
         end_date = st.date_input("To", value=date.today(), key="e_end")
+    e_filters = history_filters("e", "Category", ["Groceries", "Rent", "Transport", "Utilities", "Dining Out", "Entertainment", "Health", "Shopping", "Other"])
         
-    e_df = db.get_expenses(start_date, end_date)
+    e_df = db.query_transactions("expenses", start_date, end_date, **e_filters)
     
     if not e_df.empty:
         # Display data with format
@@ -68,9 +102,16 @@ with tab_expenses:
             del_id = st.number_input("ID to Delete", min_value=0, step=1)
             del_submit = st.form_submit_button("Delete Record")
             if del_submit:
-                db.delete_expense(del_id)
-                st.success(f"Expense {del_id} deleted.")
-                st.rerun()
+                try:
+                    deleted = db.delete_expense(del_id)
+                except db.DatabaseUnavailable as e:
+                    st.error(f"Could not save changes: {e}")
+                else:
+                    if deleted:
+                        st.success(f"Expense {del_id} deleted.")
+                    else:
+                        st.warning(f"Expense {del_id} not found. Records in archived years cannot be deleted.")
+                    st.rerun()
     else:
         st.info("No expenses found for this period.")
 
@@ -120,10 +161,14 @@ with tab_expenses:
                     new_e_person = st.selectbox("Person", p_options, index=p_idx)
                     
                     if st.form_submit_button("Update Expense"):
-                        db.update_expense(edit_id, new_e_date, new_e_amount, new_e_type, new_e_comments, new_e_person)
-                        st.success("Expense updated successfully!")
-                        del st.session_state.edit_e_data # Clear state
-                        st.rerun()
+                        try:
+                            db.update_expense(edit_id, new_e_date, new_e_amount, new_e_type, new_e_comments, new_e_person)
+                        except db.DatabaseUnavailable as e:
+                            st.error(f"Could not save changes: {e}")
+                        else:
+                            st.success("Expense updated successfully!")
+                            del st.session_state.edit_e_data # Clear state
+                            st.rerun()
             else:
                 st.warning("ID changed. Please click 'Fetch Expense Details' again.")
 
@@ -144,10 +189,14 @@ with tab_revenue:
         submitted_r = st.form_submit_button("Add Revenue")
         if submitted_r:
             if r_amount > 0:
-                db.add_revenue(r_date, r_amount, r_type, r_comments, r_person)
-                st.session_state.last_person = r_person
-                st.success(f"Revenue added for {r_person}!")
-                st.rerun()
+                try:
+                    db.add_revenue(r_date, r_amount, r_type, r_comments, r_person)
+                except db.DatabaseUnavailable as e:
+                    st.error(f"Could not save changes: {e}")
+                else:
+                    st.session_state.last_person = r_person
+                    st.success(f"Revenue added for {r_person}!")
+                    st.rerun()
             else:
                 st.error("Amount must be positive.")
 
@@ -157,8 +206,9 @@ with tab_revenue:
         r_start_date = st.date_input("From", value=date(date.today().year, date.today().month, 1), key="r_start")
     with col_rf2:
         r_end_date = st.date_input("To", value=date.today(), key="r_end")
+    r_filters = history_filters("r", "Source", ["Salary", "Bonus", "Gift", "Investment", "Other"])
         
-    r_df = db.get_revenue(r_start_date, r_end_date)
+    r_df = db.query_transactions("revenue", r_start_date, r_end_date, **r_filters)
     
     if not r_df.empty:
         display_r_df = r_df.copy()
@@ -173,9 +223,16 @@ with tab_revenue:
             r_del_id = st.number_input("ID to Delete", min_value=0, step=1)
             r_del_submit = st.form_submit_button("Delete Record")
             if r_del_submit:
-                db.delete_revenue(r_del_id)
-                st.success(f"Revenue {r_del_id} deleted.")
-                st.rerun()
+                try:
+                    deleted = db.delete_revenue(r_del_id)
+                except db.DatabaseUnavailable as e:
+                    st.error(f"Could not save changes: {e}")
+                else:
+                    if deleted:
+                        st.success(f"Revenue {r_del_id} deleted.")
+                    else:
+                        st.warning(f"Revenue {r_del_id} not found. Records in archived years cannot be deleted.")
+                    st.rerun()
     else:
         st.info("No revenue records found for this period.")
 
@@ -221,9 +278,85 @@ with tab_revenue:
                     new_r_person = st.selectbox("Person", p_options, index=p_idx)
                     
                     if st.form_submit_button("Update Revenue"):
-                        db.update_revenue(edit_r_id, new_r_date, new_r_amount, new_r_type, new_r_comments, new_r_person)
-                        st.success("Revenue updated successfully!")
-                        del st.session_state.edit_r_data
-                        st.rerun()
+                        try:
+                            db.update_revenue(edit_r_id, new_r_date, new_r_amount, new_r_type, new_r_comments, new_r_person)
+                        except db.DatabaseUnavailable as e:
+                            st.error(f"Could not save changes: {e}")
+                        else:
+                            st.success("Revenue updated successfully!")
+                            del st.session_state.edit_r_data
+                            st.rerun()
             else:
                 st.warning("ID changed. Please click 'Fetch Revenue Details' again.")
+
+# --- RECURRING TAB ---
+with tab_recurring:
+    st.subheader("Add Recurring Rule")
+    rec_kind = st.selectbox("Applies To", ["expenses", "revenue"], format_func=str.capitalize, key="rec_kind")
+    with st.form("add_recurring_form", clear_on_submit=True):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            if rec_kind == "expenses":
+                rec_type = st.selectbox("Category", ["Groceries", "Rent", "Transport", "Utilities", "Dining Out", "Entertainment", "Health", "Shopping", "Other"], key="rec_type")
+            else:
+                rec_type = st.selectbox("Source", ["Salary", "Bonus", "Gift", "Investment", "Other"], key="rec_type")
+            rec_amount = st.number_input("Amount (INR)", min_value=0.0, step=100.0, key="rec_amount")
+        with col2:
+            rec_cadence = st.selectbox("Cadence", list(db.RECURRING_CADENCES), index=1, format_func=str.capitalize, key="rec_cadence")
+            rec_comments = st.text_input("Comments", key="rec_comments")
+        with col3:
+            rec_start = st.date_input("Start", value=date(date.today().year, date.today().month, 1), key="rec_start")
+            rec_has_end = st.checkbox("Has End Date", key="rec_has_end")
+            rec_end = st.date_input("End", value=date.today(), key="rec_end")
+            rec_person = st.selectbox("Person", ["Yateesh", "Prasanna"], index=["Yateesh", "Prasanna"].index(st.session_state.last_person), key="rec_person")
+
+        if st.form_submit_button("Add Rule"):
+            if rec_amount <= 0:
+                st.error("Amount must be positive.")
+            elif rec_has_end and rec_end < rec_start:
+                st.error("End date must be after the start date.")
+            else:
+                try:
+                    db.add_recurring_rule(rec_kind, rec_amount, rec_type, rec_comments, rec_person, rec_cadence, rec_start, rec_end if rec_has_end else None)
+                except db.DatabaseUnavailable as e:
+                    st.error(f"Could not save changes: {e}")
+                else:
+                    st.success("Recurring rule added!")
+                    st.rerun()
+
+    st.subheader("Recurring Rules")
+    rules_df = db.get_recurring_rules()
+    if not rules_df.empty:
+        display_rules_df = rules_df.copy()
+        display_rules_df['amount'] = display_rules_df['amount'].apply(lambda x: format_currency(x))
+        st.dataframe(display_rules_df, use_container_width=True)
+
+        st.caption("To delete a rule, enter its ID below. Entries it already generated are kept.")
+        with st.form("delete_recurring_form"):
+            rec_del_id = st.number_input("ID to Delete", min_value=0, step=1)
+            if st.form_submit_button("Delete Rule"):
+                try:
+                    db.delete_recurring_rule(rec_del_id)
+                except db.DatabaseUnavailable as e:
+                    st.error(f"Could not save changes: {e}")
+                else:
+                    st.success(f"Rule {rec_del_id} deleted.")
+                    st.rerun()
+    else:
+        st.info("No recurring rules yet.")
+
+    st.divider()
+    st.subheader("Generate Entries")
+    st.caption("Creates every due entry for all rules in the chosen range. Entries that already exist are skipped, so this is safe to re-run.")
+    col_g1, col_g2 = st.columns(2)
+    with col_g1:
+        gen_from = st.date_input("From", value=date(date.today().year, 1, 1), key="gen_from")
+    with col_g2:
+        gen_to = st.date_input("To", value=date.today(), key="gen_to")
+    if st.button("Generate Recurring Entries"):
+        try:
+            created = db.generate_recurring(gen_from, gen_to)
+        except db.DatabaseUnavailable as e:
+            st.error(f"Could not generate entries: {e}")
+        else:
+            st.success(f"Created {created} entries.")
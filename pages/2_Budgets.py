@@ -39,9 +39,13 @@ with st.form("add_budget_form", clear_on_submit=True):
             # Check if budget exists is skipped for MVP as per plan, we rely on insert
             # Ideally we should update if exists.
             # db.add_budget just inserts.
-            db.add_budget(b_month, b_amount, b_comments)
-            st.success(f"Budget for {b_month} set to {format_currency(b_amount)}")
-            st.rerun()
+            try:
+                db.add_budget(b_month, b_amount, b_comments)
+            except db.DatabaseUnavailable as e:
+                st.error(f"Could not save changes: {e}")
+            else:
+                st.success(f"Budget for {b_month} set to {format_currency(b_amount)}")
+                st.rerun()
         else:
             st.error("Budget amount must be positive.")
 
@@ -62,9 +66,13 @@ if not budgets_df.empty:
         del_id = st.number_input("ID to Delete", min_value=0, step=1)
         del_submit = st.form_submit_button("Delete Budget")
         if del_submit:
-            db.delete_budget(del_id)
-            st.success(f"Budget {del_id} deleted.")
-            st.rerun()
+            try:
+                db.delete_budget(del_id)
+            except db.DatabaseUnavailable as e:
+                st.error(f"Could not save changes: {e}")
+            else:
+                st.success(f"Budget {del_id} deleted.")
+                st.rerun()
 else:
     st.info("No budgets set yet.")
 
@@ -103,9 +111,13 @@ with st.expander("Edit an existing budget"):
                 new_b_comments = st.text_input("Comments", value=curr_b['comments'])
                 
                 if st.form_submit_button("Update Budget"):
-                    db.update_budget(edit_b_id, new_b_month, new_b_amount, new_b_comments)
-                    st.success("Budget updated successfully!")
-                    del st.session_state.edit_b_data
-                    st.rerun()
+                    try:
+                        db.update_budget(edit_b_id, new_b_month, new_b_amount, new_b_comments)
+                    except db.DatabaseUnavailable as e:
+                        st.error(f"Could not save changes: {e}")
+                    else:
+                        st.success("Budget updated successfully!")
+                        del st.session_state.edit_b_data
+                        st.rerun()
         else:
             st.warning("ID changed. Please click 'Fetch Budget Details' again.")
@@ -7,7 +7,7 @@ st.set_page_config(page_title="Import / Export", page_icon="📤", layout="wide"
 
 st.title("📤 Import / Export Data")
 
-tab_import, tab_export = st.tabs(["📥 Import CSV", "📤 Export CSV"])
+tab_import, tab_export, tab_archive = st.tabs(["📥 Import CSV", "📤 Export CSV", "🗄️ Archive"])
 
 # --- IMPORT TAB ---
 with tab_import:
@@ -93,6 +93,10 @@ with tab_import:
                                 db.add_budget(m_val, amt, comm)
                             
                             success_count += 1
+                        except db.DatabaseUnavailable as e:
+                            # Remaining rows would fail the same way
+                            errors.append(f"Row {index+1}: {str(e)}. Import stopped.")
+                            break
                         except Exception as e:
                             errors.append(f"Row {index+1}: {str(e)}")
                         
@@ -131,3 +135,34 @@ with tab_export:
             file_name=f"{export_table}_{date_str}.csv",
             mime="text/csv",
         )
+
+
+# --- ARCHIVE TAB ---
+with tab_archive:
+    st.subheader("Archive Closed Years")
+    st.info("Archiving moves a past year's transactions into compressed storage. Dashboards, history and exports still include them, but archived rows can no longer be edited or deleted.")
+
+    col_a1, col_a2 = st.columns(2)
+    with col_a1:
+        archive_table = st.selectbox("Table", ["expenses", "revenue"], key="archive_table")
+    with col_a2:
+        last_closed_year = datetime.now().year - 1
+        archive_year = st.number_input("Year", min_value=2000, max_value=last_closed_year, value=last_closed_year, step=1)
+
+    if st.button("Archive Year"):
+        try:
+            moved = db.archive_year(archive_table, int(archive_year))
+        except db.DatabaseUnavailable as e:
+            st.error(f"Could not archive: {e}")
+        else:
+            if moved:
+                st.success(f"Archived {archive_year} {archive_table}: {moved} rows in storage for that year.")
+            else:
+                st.info(f"No {archive_table} rows left to archive for {archive_year}.")
+
+    st.subheader("Archived Segments")
+    segments_df = db.get_archive_segments()
+    if not segments_df.empty:
+        st.dataframe(segments_df, use_container_width=True)
+    else:
+        st.info("Nothing archived yet.")
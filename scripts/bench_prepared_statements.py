@@ -0,0 +1,123 @@
+"""Compare plain vs prepared execution of db_manager's hot queries.
+
+Seeds a large dataset into the database configured through the SUPABASE_*
+environment variables (use a local Postgres, not production), then times each
+hot statement with and without PREPARE/EXECUTE.
+
+    SUPABASE_HOST=localhost SUPABASE_DB=finance SUPABASE_USER=postgres \\
+    SUPABASE_PASS=postgres python scripts/bench_prepared_statements.py --rows 500000
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import psycopg2
+
+import db_manager as db
+
+SEED_TAG = "bench-seed"
+
+WORKLOADS = [
+    ("monthly_revenue_total", (date(2020, 6, 1), date(2020, 7, 1), "2020-06")),
+    ("monthly_expense_total", (date(2020, 6, 1), date(2020, 7, 1), "2020-06")),
+    ("monthly_budget", ("2020-06",)),
+    ("expense_breakdown", (date(2020, 6, 1), date(2020, 7, 1), "2020-06")),
+    ("expenses_in_range", (date(2020, 6, 1), date(2020, 6, 30))),
+    ("insert_expense", (date(2020, 6, 15), 123.45, "Groceries", SEED_TAG, "Yateesh")),
+]
+
+
+def seed(con, rows, start=date(2015, 1, 1), budget_months=("2020-06",)):
+    # Rows fall in the ten years from start; each of budget_months gets a budget row
+    cur = con.cursor()
+    for table, types in (
+        ("expenses", "ARRAY['Groceries','Rent','Transport','Utilities','Dining Out','Entertainment','Health','Shopping','Other']"),
+        ("revenue", "ARRAY['Salary','Bonus','Gift','Investment','Other']"),
+    ):
+        cur.execute(f"""
+            INSERT INTO {table} (date, amount, type, comments, person)
+            SELECT %s::date + (random() * 3650)::int,
+                   round((random() * 5000)::numeric, 2),
+                   ({types})[1 + floor(random() * array_length({types}, 1))::int],
+                   %s,
+                   (ARRAY['Yateesh','Prasanna'])[1 + floor(random() * 2)::int]
+            FROM generate_series(1, %s)
+        """, (start, SEED_TAG, rows))
+        cur.execute(f"ANALYZE {table}")
+    cur.executemany("INSERT INTO budget (month, amount, comments) VALUES (%s, 50000, %s)",
+                    [(month, SEED_TAG) for month in budget_months])
+    con.commit()
+    cur.close()
+
+
+def cleanup(con):
+    cur = con.cursor()
+    for table in ("expenses", "revenue", "budget"):
+        cur.execute(f"DELETE FROM {table} WHERE comments = %s", (SEED_TAG,))
+    con.commit()
+    cur.close()
+
+
+def planning_ms(con, name, params):
+    # Planner time Postgres reports for one unprepared execution
+    query = db.PREPARED_STATEMENTS[name][1]
+    cur = con.cursor()
+    cur.execute("EXPLAIN (ANALYZE, SUMMARY) " + query, params)
+    plan = "\n".join(row[0] for row in cur.fetchall())
+    cur.close()
+    con.rollback()
+    match = re.search(r"Planning Time: ([\d.]+) ms", plan)
+    return float(match.group(1)) if match else float("nan")
+
+
+def run(con, name, params, iterations, prepared):
+    os.environ["SUPABASE_PREPARED_STATEMENTS"] = "1" if prepared else "0"
+    cur = con.cursor()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        db.execute_prepared(cur, name, params)
+        if cur.description:
+            cur.fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    cur.close()
+    # Inserts are measured but never kept
+    con.rollback()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000, help="rows to seed into expenses and revenue")
+    parser.add_argument("--iterations", type=int, default=500, help="executions per statement and mode")
+    parser.add_argument("--keep", action="store_true", help="keep the seeded rows afterwards")
+    args = parser.parse_args()
+
+    con = psycopg2.connect(**db._connection_params())
+    print(f"Seeding {args.rows} rows per table...")
+    seed(con, args.rows)
+
+    try:
+        print(f"{'statement':<24}{'plan ms':>9}{'plain p50':>11}{'prep p50':>10}{'plain p95':>11}{'prep p95':>10}{'speedup':>9}")
+        for name, params in WORKLOADS:
+            plan = planning_ms(con, name, params)
+            plain = run(con, name, params, args.iterations, prepared=False)
+            prepared = run(con, name, params, args.iterations, prepared=True)
+            p95 = lambda xs: statistics.quantiles(xs, n=20)[-1]
+            speedup = statistics.mean(plain) / statistics.mean(prepared)
+            print(f"{name:<24}{plan:>9.3f}{statistics.median(plain):>11.3f}{statistics.median(prepared):>10.3f}"
+                  f"{p95(plain):>11.3f}{p95(prepared):>10.3f}{speedup:>8.2f}x")
+    finally:
+        if not args.keep:
+            cleanup(con)
+        con.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Check read/write routing against two local Postgres instances.
+
+Point SUPABASE_* at one instance (the primary) and SUPABASE_REPLICA_* at a
+second one listening on another port, then run:
+
+    SUPABASE_HOST=localhost SUPABASE_PORT=5432 SUPABASE_DB=finance \\
+    SUPABASE_USER=postgres SUPABASE_PASS=postgres \\
+    SUPABASE_REPLICA_HOST=localhost SUPABASE_REPLICA_PORT=5433 \\
+    python scripts/check_replica_routing.py
+
+The instances don't need to replicate; the script only checks which one
+serves each read. It asserts that reads go to the replica, stay on the primary
+during the read-your-writes window after a write, return to the replica
+afterwards, and fall back to the primary when the replica is unreachable.
+"""
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Short window so the check doesn't have to wait long; must be set before import
+WINDOW_SECONDS = 2
+os.environ["SUPABASE_READ_YOUR_WRITES_SECONDS"] = str(WINDOW_SECONDS)
+
+import psycopg2
+
+import db_manager as db
+
+CHECK_TAG = "routing-check"
+
+
+def server_port(con):
+    cur = con.cursor()
+    cur.execute("SELECT current_setting('port')")
+    port = int(cur.fetchone()[0])
+    cur.close()
+    return port
+
+
+def backend_for_reads():
+    con = db.get_read_connection()
+    try:
+        return server_port(con)
+    finally:
+        db.release_connection(con)
+
+
+def unused_port():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def check(label, actual, expected):
+    assert actual == expected, f"{label}: reads served by port {actual}, expected {expected}"
+    print(f"ok  {label} (port {actual})")
+
+
+def main():
+    if not os.getenv("SUPABASE_REPLICA_HOST"):
+        sys.exit("Set SUPABASE_REPLICA_HOST / SUPABASE_REPLICA_PORT to a second local instance.")
+
+    primary = psycopg2.connect(**db._connection_params("primary"))
+    replica = psycopg2.connect(**db._connection_params("replica"))
+    primary_port, replica_port = server_port(primary), server_port(replica)
+    replica.close()
+    assert primary_port != replica_port, "primary and replica must be different instances (ports)"
+
+    db._session_state().pop("_db_last_write", None)
+    check("read before any write", backend_for_reads(), replica_port)
+
+    db.add_budget("1999-01", 1, CHECK_TAG)
+    check("read right after a write", backend_for_reads(), primary_port)
+
+    time.sleep(WINDOW_SECONDS + 0.5)
+    check("read after the read-your-writes window", backend_for_reads(), replica_port)
+
+    # Replica goes away: reads must keep working on the primary
+    os.environ["SUPABASE_REPLICA_PORT"] = str(unused_port())
+    db._get_pool.clear()
+    check("read with the replica unreachable", backend_for_reads(), primary_port)
+
+    cur = primary.cursor()
+    cur.execute("DELETE FROM budget WHERE comments = %s", (CHECK_TAG,))
+    primary.commit()
+    primary.close()
+    print("all routing checks passed")
+
+
+if __name__ == "__main__":
+    main()
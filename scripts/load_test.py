@@ -0,0 +1,227 @@
+"""Concurrent-session load test for the Streamlit pages.
+
+Drives Home.py, pages/1_Transactions.py and pages/3_Import_Export.py with N
+simulated sessions (Streamlit's AppTest, all in this one process, sharing
+db_manager's pools and caches like a single server would) against a seeded
+local Postgres configured through SUPABASE_* environment variables, and
+reports per-page render latency percentiles, errors, degraded renders (stale
+or missing data while the database was unavailable), open database
+connections and throughput.
+
+    SUPABASE_HOST=localhost SUPABASE_DB=finance SUPABASE_USER=postgres \\
+    SUPABASE_PASS=postgres python scripts/load_test.py --sessions 20 --duration 60
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import psycopg2
+from streamlit.testing.v1 import AppTest
+
+import db_manager as db
+from bench_prepared_statements import SEED_TAG, cleanup, seed
+
+PAGES = {
+    "home": "Home.py",
+    "transactions": os.path.join("pages", "1_Transactions.py"),
+    "import_export": os.path.join("pages", "3_Import_Export.py"),
+}
+
+# Seeded rows cover the ten years up to today, so the pages' current-month
+# defaults hit data too
+SEED_START = date.today() - timedelta(days=3650)
+
+
+def seeded_months():
+    months = []
+    year, month = SEED_START.year, SEED_START.month
+    while (year, month) <= (date.today().year, date.today().month):
+        months.append((year, month))
+        year, month = year + month // 12, month % 12 + 1
+    return months
+
+
+def month_range(year, month):
+    first_day = date(year, month, 1)
+    return first_day, date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+
+
+def app_secrets():
+    params = db._connection_params()
+    return {key: params[key] for key in ("host", "database", "user", "password", "port")}
+
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.degraded = defaultdict(int)
+
+    def record(self, page, seconds, error, degraded=False):
+        with self.lock:
+            self.latencies[page].append(seconds * 1000)
+            if error:
+                self.errors[page] += 1
+            if degraded:
+                self.degraded[page] += 1
+
+    def record_error(self, page):
+        # A failure that never produced a render: no latency sample
+        with self.lock:
+            self.errors[page] += 1
+
+
+def timed_run(at, results, page):
+    start = time.perf_counter()
+    try:
+        at.run()
+        error = bool(at.exception)
+        # db_manager._degradable reports an outage as a warning, not an exception
+        degraded = any("Database unavailable" in w.value for w in at.warning)
+    except Exception:
+        error, degraded = True, False
+    results.record(page, time.perf_counter() - start, error, degraded)
+
+
+def drive_home(at, results):
+    # Flip between seeded months so both cache hits and misses are exercised
+    year, month = random.choice(seeded_months())
+    at.sidebar.number_input[0].set_value(year)
+    at.sidebar.selectbox[0].set_value(month)
+    timed_run(at, results, "home")
+
+
+def drive_transactions(at, results, write_ratio):
+    if random.random() < write_ratio:
+        at.number_input(key="e_amount").set_value(round(random.uniform(10, 2000), 2))
+        at.text_input(key="e_comments").set_value(SEED_TAG)
+        next(b for b in at.button if b.label == "Add Expense").click()
+        timed_run(at, results, "transactions (write)")
+    else:
+        # Browse a random seeded month's history
+        start, end = month_range(*random.choice(seeded_months()))
+        at.date_input(key="e_start").set_value(start)
+        at.date_input(key="e_end").set_value(end)
+        timed_run(at, results, "transactions")
+
+
+def drive_import_export(at, results):
+    export_select = next(s for s in at.selectbox if s.label == "Select Table to Export")
+    export_select.set_value(random.choice(["expenses", "revenue", "budget"]))
+    next(b for b in at.button if b.label == "Generate CSV").click()
+    timed_run(at, results, "import_export")
+
+
+def session(deadline, results, write_ratio, timeout):
+    # One simulated user: open every page once, then keep interacting
+    apps = {}
+    for name, path in PAGES.items():
+        at = AppTest.from_file(os.path.join(ROOT, path), default_timeout=timeout)
+        at.secrets["supabase"] = app_secrets()
+        timed_run(at, results, name)
+        apps[name] = at
+    while time.time() < deadline:
+        name = random.choice(list(PAGES))
+        try:
+            if name == "home":
+                drive_home(apps[name], results)
+            elif name == "transactions":
+                drive_transactions(apps[name], results, write_ratio)
+            else:
+                drive_import_export(apps[name], results)
+        except Exception:
+            # Widget lookups fail when a previous render errored; start the page over
+            results.record_error(name)
+            apps[name] = AppTest.from_file(os.path.join(ROOT, PAGES[name]), default_timeout=timeout)
+            apps[name].secrets["supabase"] = app_secrets()
+
+
+def sample_connections(stop, samples, interval):
+    con = psycopg2.connect(**db._connection_params())
+    con.autocommit = True
+    cur = con.cursor()
+    while not stop.is_set():
+        cur.execute("""
+            SELECT count(*) FROM pg_stat_activity
+            WHERE datname = current_database() AND pid <> pg_backend_pid()
+        """)
+        samples.append(cur.fetchone()[0])
+        stop.wait(interval)
+    con.close()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def report(results, samples, wall_seconds, sessions):
+    total = sum(len(v) for v in results.latencies.values())
+    print(f"\n{sessions} sessions, {wall_seconds:.1f}s, {total} renders, {total / wall_seconds:.1f} renders/s")
+    print(f"{'page':<22}{'renders':>8}{'errors':>8}{'degraded':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for page in sorted(set(results.latencies) | set(results.errors)):
+        values = results.latencies[page]
+        counts = f"{page:<22}{len(values):>8}{results.errors[page]:>8}{results.degraded[page]:>9}"
+        if not values:
+            print(counts)
+            continue
+        print(f"{counts}{percentile(values, 50):>9.0f}"
+              f"{percentile(values, 95):>9.0f}{percentile(values, 99):>9.0f}{max(values):>9.0f}")
+    if samples:
+        print(f"\nOpen database connections: peak {max(samples)}, mean {sum(samples) / len(samples):.1f} "
+              f"(pool max {db.POOL_MAX_CONN} per target)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent simulated sessions")
+    parser.add_argument("--duration", type=float, default=30, help="seconds each session keeps interacting")
+    parser.add_argument("--rows", type=int, default=50_000, help="rows to seed into expenses and revenue")
+    parser.add_argument("--write-ratio", type=float, default=0.1, help="share of Transactions interactions that add an expense")
+    parser.add_argument("--timeout", type=float, default=60, help="per-render timeout in seconds")
+    parser.add_argument("--keep", action="store_true", help="keep the seeded rows afterwards")
+    args = parser.parse_args()
+
+    con = psycopg2.connect(**db._connection_params())
+    print(f"Seeding {args.rows} rows per table...")
+    seed(con, args.rows, start=SEED_START,
+         budget_months=[f"{year}-{month:02d}" for year, month in seeded_months()])
+
+    results = Results()
+    samples = []
+    stop = threading.Event()
+    sampler = threading.Thread(target=sample_connections, args=(stop, samples, 0.5), daemon=True)
+    sampler.start()
+
+    start = time.time()
+    try:
+        with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+            futures = [
+                pool.submit(session, start + args.duration, results, args.write_ratio, args.timeout)
+                for _ in range(args.sessions)
+            ]
+            for future in futures:
+                future.result()
+        wall_seconds = time.time() - start
+    finally:
+        stop.set()
+        sampler.join()
+        if not args.keep:
+            cleanup(con)
+        con.close()
+
+    report(results, samples, wall_seconds, args.sessions)
+
+
+if __name__ == "__main__":
+    main()